@@ -0,0 +1,152 @@
+import os
+import threading
+import PyPDF2
+from docx import Document
+import openpyxl
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# PDFium is not thread-safe; serialize every call into it (uncontended in worker processes)
+_PDFIUM_LOCK = threading.Lock()
+
+
+def extracttext_fromfile(file_path: str, max_chars: int = 2000) -> str:
+    """Extract text from various file types"""
+    plaintext_extensions = [
+        '.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.xml',
+        '.yaml', '.yml', '.ini', '.log', '.csv', '.ts', '.jsx', '.tsx',
+        '.sh', '.bat', '.java', '.c', '.cpp', '.h', '.hpp', '.sql', '.php'
+    ]
+    try:
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext == '.pdf':
+            return extract_pdf(file_path, max_chars)
+        elif file_ext in ['.docx', '.doc']:
+            return extract_docx(file_path, max_chars)
+        elif file_ext in ['.xlsx', '.xls']:
+            return extract_excel(file_path, max_chars)
+        elif file_ext in plaintext_extensions:
+            return extract_plain(file_path, max_chars)
+        else:
+            return ""
+    except Exception as e:
+        return ""
+
+
+def extract_pdf(file_path: str, max_chars: int) -> str:
+    """Extract text from PDF files"""
+    if pdfium is not None:
+        return extract_pdf_pdfium(file_path, max_chars)
+    try:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            text = ""
+            for page_num in range(min(5, len(pdf_reader.pages))):
+                text += pdf_reader.pages[page_num].extract_text()
+                if len(text) > max_chars:
+                    break
+            return text[:max_chars]
+    except:
+        return ""
+
+
+def extract_pdf_pdfium(file_path: str, max_chars: int) -> str:
+    """Extract text from PDF files with the PDFium backend"""
+    try:
+        with _PDFIUM_LOCK:
+            return _read_pdfium(file_path, max_chars)
+    except:
+        return ""
+
+
+def _read_pdfium(file_path: str, max_chars: int) -> str:
+    """Read up to five pages through PDFium; callers must hold _PDFIUM_LOCK"""
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        parts = []
+        total = 0
+        for page_num in range(min(5, len(pdf))):
+            page = pdf[page_num]
+            textpage = page.get_textpage()
+            page_text = textpage.get_text_range()
+            # Close here so no PDFium finalizer runs later outside the lock
+            textpage.close()
+            page.close()
+            parts.append(page_text)
+            total += len(page_text)
+            if total > max_chars:
+                break
+        return "".join(parts)[:max_chars]
+    finally:
+        pdf.close()
+
+
+def extract_docx(file_path: str, max_chars: int) -> str:
+    """Extract text from Word documents"""
+    try:
+        doc = Document(file_path)
+        parts = []
+        total = 0
+        for paragraph in doc.paragraphs:
+            paragraph_text = paragraph.text
+            parts.append(paragraph_text)
+            parts.append("\n")
+            total += len(paragraph_text) + 1
+            if total > max_chars:
+                break
+        return "".join(parts)[:max_chars]
+    except:
+        return ""
+
+
+def extract_excel(file_path: str, max_chars: int) -> str:
+    """Extract text from Excel files"""
+    try:
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    except:
+        return ""
+    try:
+        parts = []
+        total = 0
+        for sheet_name in workbook.sheetnames[:3]:
+            for row in workbook[sheet_name].iter_rows(max_row=50, values_only=True):
+                row_text = " ".join(cell if type(cell) is str else str(cell) for cell in row if cell is not None)
+                if not row_text:
+                    continue
+                parts.append(row_text)
+                parts.append("\n")
+                total += len(row_text) + 1
+                if total > max_chars:
+                    break
+            if total > max_chars:
+                break
+        return "".join(parts)[:max_chars]
+    except:
+        return ""
+    finally:
+        # Read-only workbooks keep the file handle open until closed
+        workbook.close()
+
+
+def extract_plain(file_path: str, max_chars: int) -> str:
+    """Extract text from plain text files"""
+    try:
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, max_chars * 4, os.POSIX_FADV_SEQUENTIAL)
+            # One read of up to 4 bytes per char covers any UTF-8 text
+            data = os.read(fd, max_chars * 4)
+        finally:
+            os.close(fd)
+        text = data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        return text[:max_chars]
+    except:
+        return ""
+
+
+def extract_batch(file_paths: list[str]) -> list[str]:
+    """Extract a chunk of files in one worker call (runs in worker processes)"""
+    return [extracttext_fromfile(file_path) for file_path in file_paths]
@@ -1,237 +1,446 @@
 import os
 import json
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+import functools
+import heapq
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import time
 from mcp.server.fastmcp import FastMCP
 import re
-import PyPDF2
-from docx import Document
-import openpyxl
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from ExtractTextFromFile import extract_batch
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+_STOPPER = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'about'})
+_WORD_RE = re.compile(r'\b\w+\b')
 
 
 class FileSearcherByContent:
-    def __init__(self):
+    def __init__(self, extract_timeout: float | None = 120, extract_timeout_per_file: float = 0.05):
         self.max_fsize = 100 * 1024 * 1024
         self.max_prev = 500
+        self.min_process_files = 64
+        # Extraction deadline: a base budget plus an allowance per eligible file; None waits for every file
+        self.extract_timeout = extract_timeout
+        self.extract_timeout_per_file = extract_timeout_per_file
+        self.max_depth = 6
+        self.scan_workers = 8
+        self.encode_batch_size = 1024
+        # Minimum relevance for a result; files whose best possible score
+        # cannot beat it (or the current top results) skip the encoder
+        self.prefilter_threshold = 0.3
         try:
-            self.semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
+            if torch.cuda.is_available():
+                device = "cuda"
+            elif torch.backends.mps.is_available():
+                device = "mps"
+            else:
+                device = "cpu"
+            self.semantic_model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+            if device == "cuda":
+                self.semantic_model.half()
         except:
             self.semantic_model = None
+        self.emb_cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'ContextualFileSearchMCP',
+                                           'embeddings-all-MiniLM-L6-v2.sqlite3')
+        self.emb_cache = self.open_embedding_cache(self.emb_cache_path)
+        # In-memory FAISS index holding the current version of each file; past max_indexed
+        # files the least recently searched ones are evicted (doc_paths is kept in LRU order)
+        self.doc_index = None
+        self.doc_ids = {}
+        self.doc_keys = {}
+        self.doc_paths = OrderedDict()
+        self.next_doc_id = 0
+        self.max_indexed = 100_000
+        self.process_pool = None
+        self.thread_pool = None
+        atexit.register(self.shutdown)
+    
+    def get_executor(self, use_processes: bool):
+        """Return the shared extraction pool, creating it on first use"""
+        # Spawned workers import the parsers once, so the pools live as long as the server
+        if use_processes:
+            if self.process_pool is None:
+                self.process_pool = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 61))
+            return self.process_pool
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPoolExecutor(max_workers=4)
+        return self.thread_pool
     
-    def extracttext_fromfile(self, file_path: str, max_chars: int = 2000) -> str:
-        """Extract text from various file types"""
-        plaintext_extensions = [
-            '.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.xml',
-            '.yaml', '.yml', '.ini', '.log', '.csv', '.ts', '.jsx', '.tsx',
-            '.sh', '.bat', '.java', '.c', '.cpp', '.h', '.hpp', '.sql', '.php'
-        ]
+    def shutdown(self):
+        """Stop the extraction pools"""
+        for pool in (self.process_pool, self.thread_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self.process_pool = None
+        self.thread_pool = None
+    
+    def open_embedding_cache(self, path: str) -> sqlite3.Connection | None:
+        """Open the on-disk cache of document embeddings"""
         try:
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if file_ext == '.pdf':
-                return self.extract_pdf(file_path, max_chars)
-            elif file_ext in ['.docx', '.doc']:
-                return self.extract_docx(file_path, max_chars)
-            elif file_ext in ['.xlsx', '.xls']:
-                return self.extract_excel(file_path, max_chars)
-            elif file_ext in plaintext_extensions:
-                return self.extract_plain(file_path, max_chars)
-            else:
-                return ""
-        except Exception as e:
-            return ""
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, path TEXT, dim INT, vec BLOB)")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_path ON embeddings (path)")
+            conn.commit()
+            return conn
+        except Exception:
+            return None
+    
+    def embedding_key(self, file_path: str, stat: os.stat_result) -> str:
+        """Build the cache key of a file version"""
+        return f"{file_path}:{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def embedding_path(self, key: str) -> str:
+        """Recover the file path from a cache key"""
+        return key.rsplit(':', 2)[0]
     
-    def extract_pdf(self, file_path: str, max_chars: int) -> str:
-        """Extract text from PDF files"""
+    def load_embeddings(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Load cached embeddings for the given keys"""
+        cached = {}
+        if self.emb_cache is None:
+            return cached
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page_num in range(min(5, len(pdf_reader.pages))):
-                    text += pdf_reader.pages[page_num].extract_text()
-                    if len(text) > max_chars:
-                        break
-                return text[:max_chars]
-        except:
-            return ""
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.emb_cache.execute(
+                    f"SELECT key, dim, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, dim, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float16)
+                    if vec.shape[0] == dim:
+                        cached[key] = vec.astype(np.float32)
+        except Exception:
+            pass
+        return cached
     
-    def extract_docx(self, file_path: str, max_chars: int) -> str:
-        """Extract text from Word documents"""
+    def store_embeddings(self, keys: list[str], vecs: np.ndarray):
+        """Persist normalized embeddings in the cache as float16, replacing older versions of each file"""
+        if self.emb_cache is None or not keys:
+            return
         try:
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-                if len(text) > max_chars:
+            vecs = np.asarray(vecs, dtype=np.float16)
+            rows = [(key, self.embedding_path(key), vec.shape[0], vec.tobytes()) for key, vec in zip(keys, vecs)]
+            self.emb_cache.executemany("DELETE FROM embeddings WHERE path = ? AND key != ?",
+                                       [(path, key) for key, path, _, _ in rows])
+            self.emb_cache.executemany("INSERT OR REPLACE INTO embeddings (key, path, dim, vec) VALUES (?, ?, ?, ?)",
+                                       rows)
+            self.emb_cache.commit()
+        except Exception:
+            pass
+    
+    def remove_indexed(self, keys: list[str]):
+        """Drop embeddings from the in-memory FAISS index"""
+        if not keys:
+            return
+        self.doc_index.remove_ids(np.array([self.doc_ids[key] for key in keys], dtype=np.int64))
+        for key in keys:
+            del self.doc_keys[self.doc_ids.pop(key)]
+            del self.doc_paths[self.embedding_path(key)]
+    
+    def index_embeddings(self, keys: list[str], vecs: list[np.ndarray], keep: set[str] = frozenset()):
+        """Add embeddings to the in-memory FAISS index, replacing older versions of the same files
+        and evicting least recently searched files other than those in keep"""
+        new = [(key, vec) for key, vec in zip(keys, vecs) if key not in self.doc_ids]
+        if faiss is None or not new:
+            return
+        if self.doc_index is None:
+            self.doc_index = faiss.IndexIDMap2(faiss.IndexFlatIP(new[0][1].shape[0]))
+
+        paths = [self.embedding_path(key) for key, _ in new]
+        self.remove_indexed([self.doc_paths[path] for path in paths if path in self.doc_paths])
+        overflow = self.doc_index.ntotal + len(new) - self.max_indexed
+        if overflow > 0:
+            victims = []
+            for key in self.doc_paths.values():
+                if len(victims) == overflow:
                     break
-            return text[:max_chars]
-        except:
-            return ""
+                if key not in keep:
+                    victims.append(key)
+            self.remove_indexed(victims)
+            # Whatever still does not fit stays out of the index; callers score it directly
+            new = new[:max(0, self.max_indexed - self.doc_index.ntotal)]
+            if not new:
+                return
+
+        ids = np.arange(self.next_doc_id, self.next_doc_id + len(new), dtype=np.int64)
+        self.next_doc_id += len(new)
+        for doc_id, (key, _) in zip(ids.tolist(), new):
+            self.doc_ids[key] = doc_id
+            self.doc_keys[doc_id] = key
+            self.doc_paths[self.embedding_path(key)] = key
+        self.doc_index.add_with_ids(np.stack([vec for _, vec in new]).astype(np.float32), ids)
     
-    def extract_excel(self, file_path: str, max_chars: int) -> str:
-        """Extract text from Excel files"""
-        try:
-            workbook = openpyxl.load_workbook(file_path, read_only=True)
-            text = ""
-            for sheet_name in list(workbook.sheetnames)[:3]:
-                sheet = workbook[sheet_name]
-                for row in sheet.iter_rows(max_row=50, values_only=True):
-                    row_text = " ".join([str(cell) for cell in row if cell is not None])
-                    text += row_text + "\n"
-                    if len(text) > max_chars:
-                        break
-            return text[:max_chars]
-        except:
-            return ""
+    def search_index(self, hint_vec: np.ndarray, keys: list[str]) -> dict[str, float]:
+        """Score indexed embeddings against the hint with one index query"""
+        if self.doc_index is None or not keys:
+            return {}
+        ids = np.array([self.doc_ids[key] for key in keys], dtype=np.int64)
+        for key in keys:
+            self.doc_paths.move_to_end(self.embedding_path(key))
+        if len(ids) * 4 < self.doc_index.ntotal:
+            # A selector search still scans every row, so fetch the few vectors directly
+            similarities = self.doc_index.reconstruct_batch(ids) @ hint_vec
+            return dict(zip(keys, similarities.tolist()))
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+        similarities, found = self.doc_index.search(hint_vec.reshape(1, -1).astype(np.float32), len(ids),
+                                                    params=params)
+        return {self.doc_keys[doc_id]: float(similarity)
+                for similarity, doc_id in zip(similarities[0], found[0]) if doc_id >= 0}
     
-    def extract_plain(self, file_path: str, max_chars: int) -> str:
-        """Extract text from plain text files"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                return file.read(max_chars)
-        except:
-            try:
-                with open(file_path, 'r', encoding='latin-1', errors='ignore') as file:
-                    return file.read(max_chars)
-            except:
-                return ""
+    @functools.lru_cache(maxsize=128)
+    def encode_hint(self, content_hint: str) -> np.ndarray:
+        """Encode the content hint into a normalized embedding"""
+        return self.semantic_model.encode([content_hint], normalize_embeddings=True, convert_to_numpy=True)[0]
     
-    def make_keywords(self, content_hint: str) -> list[str]:
+    def make_keywords(self, content_hint: str) -> tuple[str, ...]:
         """Extract meaningful keywords from content hint"""
-        stopper = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'about'}
-        words = re.findall(r'\b\w+\b', content_hint.lower())
-        keywords = [word for word in words if len(word) > 2 and word not in stopper]
-        return keywords
+        words = _WORD_RE.findall(content_hint.lower())
+        return tuple(word for word in words if len(word) > 2 and word not in _STOPPER)
+    
+    def build_keyword_automaton(self, keywords: tuple[str, ...]):
+        """Build an Aho-Corasick automaton matching all keywords in one pass"""
+        if ahocorasick is None or not keywords:
+            return None
+        automaton = ahocorasick.Automaton()
+        for keyword in set(keywords):
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return automaton
     
-    def calculate_keyword_score(self, keywords: list[str], text: str) -> float:
+    def calculate_keyword_score(self, keywords: tuple[str, ...], text: str, automaton=None) -> float:
         """Calculate keyword matching score"""
         if not keywords or not text:
             return 0.0
         text__ = text.lower()
-        matches = sum(1 for keyword in keywords if keyword in text__)
+        if automaton is not None:
+            hits = {keyword for _, keyword in automaton.iter(text__)}
+            matches = sum(1 for keyword in keywords if keyword in hits)
+        else:
+            matches = sum(1 for keyword in keywords if keyword in text__)
         return matches / len(keywords)
     
-    def calculate_semantic_score(self, content_hint: str, text: str) -> float:
-        """Calculate semantic similarity score"""
-        if not self.semantic_model or not text.strip():
-            return 0.0
-        
-        try:
-            hint_embedding = self.semantic_model.encode([content_hint])
-            text_embedding = self.semantic_model.encode([text[:1000]])
-  
-            similarity = cosine_similarity(hint_embedding, text_embedding)[0][0]
-            return float(similarity)
-        except Exception:
-            return 0.0
+    def encode_texts(self, keys: list[str], texts: list[str]) -> np.ndarray:
+        """Encode document texts in one batch and add them to the cache"""
+        doc_vecs = self.semantic_model.encode([text[:1000] for text in texts], batch_size=self.encode_batch_size,
+                                              normalize_embeddings=True, convert_to_numpy=True,
+                                              show_progress_bar=False)
+        # Round like the cache does so fresh and cached scores agree
+        doc_vecs = doc_vecs.astype(np.float16).astype(np.float32)
+        self.store_embeddings(keys, doc_vecs)
+        return doc_vecs
     
-    def calculate_relevance_score(self, content_hint: str, extracted_text: str, filename: str) -> float:
-        """Calculate overall relevance score"""
-        keywords = self.make_keywords(content_hint)
-        
-        keyword_score = self.calculate_keyword_score(keywords, extracted_text)
-
-        filename_score = self.calculate_keyword_score(keywords, filename)
+    def calculate_relevance_score(self, keyword_score, filename_score, semantic_score=0.0):
+        """Calculate overall relevance score, elementwise when given arrays"""
         if self.semantic_model:
-            semantic_score = self.calculate_semantic_score(content_hint, extracted_text)
             return (keyword_score * 0.35) + (semantic_score * 0.5) + (filename_score * 0.15)
         else:
             return (keyword_score * 0.8) + (filename_score * 0.2)
     
-    def eligible_files(self, drive: str, extension: str) -> list[str]:
+    def calculate_relevance_scores(self, content_hint: str, items: list[tuple], keywords: tuple[str, ...], automaton,
+                                   max_results: int) -> np.ndarray:
+        """Calculate relevance scores for extracted files, NaN for files pruned before encoding"""
+        keyword_scores = np.zeros(len(items))
+        filename_scores = np.zeros(len(items))
+        has_text = np.zeros(len(items), dtype=bool)
+        pending = []
+        for i, (_, filename, _, extracted_text) in enumerate(items):
+            filename_scores[i] = self.calculate_keyword_score(keywords, filename, automaton)
+            if extracted_text:
+                has_text[i] = True
+                keyword_scores[i] = self.calculate_keyword_score(keywords, extracted_text, automaton)
+                if self.semantic_model and extracted_text.strip():
+                    pending.append(i)
+
+        partial = np.where(has_text, self.calculate_relevance_score(keyword_scores, filename_scores),
+                           filename_scores * 0.5)
+        scores = partial.copy()
+        if not pending:
+            return scores
+
+        pending = np.array(pending)
+        try:
+            hint_vec = self.encode_hint(content_hint)
+            keys = {i: self.embedding_key(items[i][0], items[i][2]) for i in pending}
+            needed = set(keys.values())
+            cached = self.load_embeddings([key for key in keys.values() if key not in self.doc_ids])
+            similarities = {}
+            if faiss is not None:
+                # Files this search needs are never evicted while indexing the cached ones
+                self.index_embeddings(list(cached), list(cached.values()), keep=needed)
+                similarities = self.search_index(hint_vec, [key for key in keys.values() if key in self.doc_ids])
+                cached = {key: vec for key, vec in cached.items() if key not in self.doc_ids}
+            if cached:
+                doc_matrix = np.stack(list(cached.values())).astype(np.float32, copy=False)
+                similarities.update(zip(cached, (doc_matrix @ hint_vec).tolist()))
+            found = np.array([keys[i] in similarities for i in pending], dtype=bool)
+            scores[pending] = np.nan
+            hits = pending[found]
+            scores[hits] = self.calculate_relevance_score(keyword_scores[hits], filename_scores[hits],
+                                                          np.array([similarities[keys[i]] for i in hits]))
+
+            # Encode the most promising files first. Once even a perfect semantic
+            # match cannot lift the best remaining file into the top results,
+            # the rest of the long tail is never sent through the model.
+            upper = self.calculate_relevance_score(keyword_scores, filename_scores, 1.0)
+            missing = pending[~found]
+            missing = missing[np.argsort(-partial[missing], kind='stable')]
+            for start in range(0, len(missing), self.encode_batch_size):
+                batch = missing[start:start + self.encode_batch_size]
+                known = scores[~np.isnan(scores)]
+                floor = self.prefilter_threshold
+                if known.size >= max_results:
+                    floor = max(floor, np.partition(known, -max_results)[-max_results])
+                if upper[batch[0]] <= floor:
+                    break
+                doc_vecs = self.encode_texts([keys[i] for i in batch], [items[i][3] for i in batch])
+                self.index_embeddings([keys[i] for i in batch], list(doc_vecs), keep=needed)
+                scores[batch] = self.calculate_relevance_score(keyword_scores[batch], filename_scores[batch],
+                                                               doc_vecs @ hint_vec)
+        except Exception:
+            unscored = np.isnan(scores)
+            scores[unscored] = partial[unscored]
+        return scores
+    
+    def eligible_files(self, drive: str, extension: str) -> list[tuple[str, os.stat_result]]:
         """Get list of candidate files efficiently"""
-        eligible = []
+        eligible = deque()
         drive_path = f"{drive}:" if len(drive) == 1 else drive
+        if not os.path.exists(drive_path):
+            return []
+
+        suffix = f".{extension.lower()}"
+        dir_q = queue.Queue()
         
-        def scan_directory(directory: str, depth: int = 0):
-            """Recursively scan directory with depth limit"""
-            if depth > 6:
-                return
-            try:
-                with os.scandir(directory) as entries:
-                    for entry in entries:
-                        if entry.is_file():
-                            if entry.name.lower().endswith(f".{extension.lower()}"):
-                                if entry.stat().st_size < self.max_fsize:
-                                    eligible.append(entry.path)
-                        elif entry.is_dir() and not entry.name.startswith('.'):
-                            scan_directory(entry.path, depth + 1)
-            except (PermissionError, OSError):
-                pass 
+        def scan_worker():
+            """Scan directories from the shared queue, queueing subdirectories"""
+            while True:
+                task = dir_q.get()
+                if task is None:
+                    return
+                directory, depth = task
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.name.lower().endswith(suffix) and entry.is_file():
+                                # DirEntry caches the stat; it is reused for the cache key and results
+                                stat = entry.stat()
+                                if stat.st_size < self.max_fsize:
+                                    eligible.append((entry.path, stat))
+                            elif entry.is_dir() and not entry.name.startswith('.'):
+                                if self.max_depth is None or depth < self.max_depth:
+                                    dir_q.put((entry.path, depth + 1))
+                except (PermissionError, OSError):
+                    pass
+                finally:
+                    dir_q.task_done()
 
-        if os.path.exists(drive_path):
-            scan_directory(drive_path)
+        # scandir is I/O-bound, so worker threads overlap the directory reads
+        dir_q.put((drive_path, 0))
+        workers = [threading.Thread(target=scan_worker, daemon=True) for _ in range(self.scan_workers)]
+        for worker in workers:
+            worker.start()
+        dir_q.join()
+        for worker in workers:
+            dir_q.put(None)
+        for worker in workers:
+            worker.join()
         
-        return eligible
+        return list(eligible)
     
-    async def search_files(self, drive: str, extension: str, content_hint: str, max_results: int = 10):
-        """Main search function"""
+    def submit_extraction(self, executor, eligible: list[tuple[str, os.stat_result]], chunksize: int) -> dict:
+        """Submit text extraction in chunks, mapping each future to its offset in eligible"""
+        # Workers get only paths and send back only text; the path and
+        # stat from the scan stay in this process and are matched by offset
+        return {executor.submit(extract_batch, [path for path, _ in eligible[i:i + chunksize]]): i
+                for i in range(0, len(eligible), chunksize)}
+    
+    async def search_files(self, drive: str, extension: str, content_hint: str, max_results: int = 10,
+                           stats: dict | None = None):
+        """Main search function; fills stats with the eligible, processed and skipped file counts"""
         eligible = self.eligible_files(drive, extension)
+        if stats is not None:
+            stats.update(eligible=len(eligible), processed=0, skipped=0, timed_out=False)
         if not eligible:
             return []
         
-        results = []
-        processed_count = 0
-        error_count = 0
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            batch_size = 20
-    
-            for num, i in enumerate(range(0, len(eligible), batch_size), 1):
-                batch = eligible[i:i + batch_size]
-                futures = []
-                for file_path in batch:
-                    future = executor.submit(self._process_single_file, file_path, content_hint)
-                    futures.append((future, file_path))
-    
-                batch_results = 0
-                for future, file_path in futures:
-                    try:
-                        result = future.result(timeout=20)
-                        processed_count += 1
-                        if result is not None:
-                            if result['relevance_score'] > 0.3:
-                                results.append(result)
-                                batch_results += 1
-                        
-                    except TimeoutError:
-                        error_count += 1
-                    except Exception as e:
-                        error_count += 1
-                
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return results[:max_results]
-
-    def _process_single_file(self, file_path: str, content_hint: str) -> dict | None:
-        """Process a single file for relevance"""
+        items = []
+        # Parsers are CPU-bound pure Python, so only processes sidestep the GIL;
+        # for a handful of files the pool start-up costs more than it saves.
+        use_processes = len(eligible) >= self.min_process_files
+        chunksize = 16 if use_processes else 1
+        futures = {}
         try:
-            stat = os.stat(file_path)
-            filename = os.path.basename(file_path)
+            try:
+                futures = self.submit_extraction(self.get_executor(use_processes), eligible, chunksize)
+            except BrokenProcessPool:
+                # A worker died in an earlier search; start a fresh pool
+                self.process_pool = None
+                futures = self.submit_extraction(self.get_executor(use_processes), eligible, chunksize)
+            timeout = None
+            if self.extract_timeout is not None:
+                timeout = self.extract_timeout + self.extract_timeout_per_file * len(eligible)
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    start = futures[future]
+                    for (file_path, stat), extracted_text in zip(eligible[start:start + chunksize], future.result()):
+                        items.append((file_path, os.path.basename(file_path), stat, extracted_text))
+                except Exception:
+                    pass
+        except TimeoutError:
+            if stats is not None:
+                stats['timed_out'] = True
+        finally:
+            # Do not block on stragglers past the deadline, but keep the pool
+            for future in futures:
+                future.cancel()
+        if stats is not None:
+            stats.update(processed=len(items), skipped=len(eligible) - len(items))
 
-            extracted_text = self.extracttext_fromfile(file_path)
-            
-            if not extracted_text:
-                keywords = self.make_keywords(content_hint)
-                relevance_score = self.calculate_keyword_score(keywords, filename) * 0.5
-            else:
-                relevance_score = self.calculate_relevance_score(content_hint, extracted_text, filename)
-                
-            preview = extracted_text[:self.max_prev] if extracted_text else f"File: {filename}"
-            
-            return {
+        keywords = self.make_keywords(content_hint)
+        automaton = self.build_keyword_automaton(keywords)
+        relevance_scores = self.calculate_relevance_scores(content_hint, items, keywords, automaton, max_results)
+
+        results = []
+        for (file_path, filename, stat, extracted_text), relevance_score in zip(items, relevance_scores):
+            if relevance_score > self.prefilter_threshold:
+                preview = extracted_text[:self.max_prev] if extracted_text else f"File: {filename}"
+                results.append({
                     "path": file_path,
                     "filename": filename,
                     "size": stat.st_size,
                     "modified": stat.st_mtime,
-                    "relevance_score": relevance_score,
-                    "preview": preview}
-        
-        except Exception:
-            return None
+                    "relevance_score": float(relevance_score),
+                    "preview": preview})
+                
+        return heapq.nlargest(max_results, results, key=lambda x: x['relevance_score'])
+
+
+def read_timeout_env(name: str, default: float) -> float:
+    """Read a timeout in seconds from the environment, keeping the default for missing or invalid values"""
+    try:
+        value = float(os.environ.get(name, default))
+    except ValueError:
+        return default
+    return value if 0 <= value < float('inf') else default
+
 
 # MCP
-mcp = FastMCP("FindFileByContent", dependencies=["sentence_transformers", "PyPDF2", "python-docx", "openpyxl"])
-searcher = FileSearcherByContent()
+mcp = FastMCP("FindFileByContent", dependencies=["sentence_transformers", "PyPDF2", "python-docx", "openpyxl", "pyahocorasick", "pypdfium2"])
+searcher = FileSearcherByContent(extract_timeout=read_timeout_env("FILE_SEARCH_TIMEOUT", 120))
 
 @mcp.tool(description="Search for files on specified drive with given extension that match the content hint and display filename and its path of the file having greater relevance score. For example: 'Search for files on E drive with pdf extension that is about Breadth first search' and display filename and path of the file having greater relevance score.")
 async def search_files_by_content(drive: str, extension: str, content_hint: str) -> str:
@@ -245,7 +454,8 @@ async def search_files_by_content(drive: str, extension: str, content_hint: str)
         JSON string with search results having filename, path, size, modified, relevance score and preview
     """
     try:
-        results = await searcher.search_files(drive, extension, content_hint)
+        stats = {}
+        results = await searcher.search_files(drive, extension, content_hint, stats=stats)
         json_results = []
         for result in results:
             if result['relevance_score'] > 0.4:
@@ -261,11 +471,15 @@ async def search_files_by_content(drive: str, extension: str, content_hint: str)
         """
         Display the filename and path of the matching files having greater relevance score
         """
-        return json.dumps({
+        response = {
             "status": "success",
             "found": len(json_results),
             "results": json_results
-        }, indent=2)
+        }
+        if stats.get('timed_out'):
+            response["message"] = (f"Search deadline reached: {stats['skipped']} of {stats['eligible']} files "
+                                   f"were not read, results may be incomplete")
+        return json.dumps(response, indent=2)
     
     except Exception as e:
         return json.dumps({